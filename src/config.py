@@ -32,6 +32,12 @@ FROM_BLOCK = "0x0"
 # Networking
 REQUEST_TIMEOUT_SECONDS = 30
 RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.8            # sleep = BACKOFF_FACTOR * 2**attempt unless Retry-After says otherwise
+MAX_CONNECTIONS = 32            # HTTP/2 multiplexes, so in practice one per Alchemy host
+MAX_IN_FLIGHT_PER_HOST = 8      # concurrent RPC calls per Alchemy host (chains x directions share it)
+KEEPALIVE_TIMEOUT_SECONDS = 60
+FORCE_IPV4 = False              # set True if IPv6 attempts stall before falling back
 
 # SQLite
 DEFAULT_DB_PATH = os.getenv("TXN_DB_PATH", "transactions.sqlite3")
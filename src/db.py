@@ -1,19 +1,28 @@
 """
 Tiny SQLite helper: initialize schema and upsert rows.
+
+One long-lived writer connection per database file (get_writer) does all the
+writing under explicit transactions; readers use their own short-lived
+connections (get_reader), which WAL lets run alongside the writer.
 """
 
-import json
+import hashlib
+import itertools
 import sqlite3
-from typing import Dict, Any, Iterable
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
 
 from config import DEFAULT_DB_PATH
+from json_codec import dumps as json_dumps
 
-_SCHEMA = """
-CREATE TABLE IF NOT EXISTS transactions (
+_TRANSACTIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_key BLOB NOT NULL UNIQUE,        -- blake2b-128 of chain|tx_hash|unique_id, see _event_key
     chain TEXT NOT NULL,
     tx_hash TEXT NOT NULL,
-    unique_id TEXT NOT NULL DEFAULT '',    -- non-null so UNIQUE can use the column directly
+    unique_id TEXT NOT NULL DEFAULT '',
     block_number INTEGER,
     block_timestamp TEXT,
     from_address TEXT,
@@ -26,10 +35,18 @@ CREATE TABLE IF NOT EXISTS transactions (
     erc721_token_id TEXT,
     erc1155_metadata TEXT,
     raw_json TEXT,
-    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(chain, tx_hash, unique_id)
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
+"""
+
+# Columns shared with tables created before event_key existed (copied on rebuild).
+_LEGACY_COLUMNS = (
+    "id, chain, tx_hash, unique_id, block_number, block_timestamp, from_address, to_address, "
+    "asset, value, raw_value_wei, category, contract_address, erc721_token_id, erc1155_metadata, "
+    "raw_json, created_at"
+)
 
+_SCHEMA = _TRANSACTIONS_TABLE.format(table="transactions") + """
 -- optional denylist tables for pruning
 CREATE TABLE IF NOT EXISTS denylist_addresses (
     address TEXT PRIMARY KEY
@@ -39,58 +56,204 @@ CREATE TABLE IF NOT EXISTS denylist_contracts (
 );
 """
 
-_INSERT = """
+_INSERT_PREFIX = """
 INSERT OR IGNORE INTO transactions
-(chain, tx_hash, unique_id, block_number, block_timestamp, from_address, to_address,
+(event_key, chain, tx_hash, unique_id, block_number, block_timestamp, from_address, to_address,
  asset, value, raw_value_wei, category, contract_address, erc721_token_id, erc1155_metadata, raw_json)
-VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-"""
+VALUES """
+_N_COLUMNS = 16
+_ROW_PLACEHOLDERS = "(" + ", ".join(["?"] * _N_COLUMNS) + ")"
+_INSERT = _INSERT_PREFIX + _ROW_PLACEHOLDERS + ";"
+
+# Rows per multi-row INSERT; capped further by the connection's bound-variable limit.
+BULK_INSERT_ROWS = 500
+
+_EMPTY: Dict[str, Any] = {}  # shared stand-in for missing sub-objects; never mutated
 
+_WRITERS: Dict[str, sqlite3.Connection] = {}
+_WRITE_LOCKS: Dict[str, threading.RLock] = {}  # per path; serializes write_transaction across threads
+_WRITERS_LOCK = threading.Lock()
 
-def _connect(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_path)
+
+def _connect(db_path: str = DEFAULT_DB_PATH, **kwargs: Any) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, **kwargs)
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA busy_timeout=30000;")
+    conn.execute("PRAGMA wal_autocheckpoint=10000;")  # pages; fewer checkpoint stalls in bulk loads
+    conn.execute("PRAGMA cache_size=-65536;")      # 64 MiB page cache
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA mmap_size=268435456;")    # 256 MiB
+    if hasattr(conn, "setlimit"):  # Python 3.11+; capped by SQLite's compile-time max
+        conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32766)
+    return conn
+
+
+def _event_key(chain: str, tx_hash: str, unique_id: str) -> bytes:
+    """
+    Fixed-width 16-byte dedup key; one narrow index instead of a 3-TEXT composite.
+    """
+    return hashlib.blake2b(f"{chain}|{tx_hash}|{unique_id}".encode(), digest_size=16).digest()
+
+
+def _columns(conn: sqlite3.Connection) -> set:
+    return {row[1] for row in conn.execute("PRAGMA table_info(transactions);")}
+
+
+def _ensure_event_key(conn: sqlite3.Connection) -> None:
+    """
+    Migrate databases created before event_key existed by rebuilding the table
+    once: only altering it would keep the old UNIQUE(chain, tx_hash, unique_id)
+    index alongside the new one, so every insert would update both.
+    Run inside write_transaction so a failed rebuild leaves the old table intact.
+    """
+    if "event_key" in _columns(conn):
+        return
+    conn.create_function("event_key", 3, _event_key, deterministic=True)
+    conn.execute(_TRANSACTIONS_TABLE.format(table="transactions_new"))
+    conn.execute(
+        f"INSERT INTO transactions_new (event_key, {_LEGACY_COLUMNS}) "
+        f"SELECT event_key(chain, tx_hash, unique_id), {_LEGACY_COLUMNS} FROM transactions;"
+    )
+    conn.execute("DROP TABLE transactions;")
+    conn.execute("ALTER TABLE transactions_new RENAME TO transactions;")
+
+
+def get_writer(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """
+    The process-wide write connection for `db_path`, opened on first use.
+    It is in autocommit mode (isolation_level=None): use write_transaction.
+    """
+    with _WRITERS_LOCK:
+        conn = _WRITERS.get(db_path)
+        if conn is None:
+            conn = _connect(db_path, isolation_level=None, check_same_thread=False)
+            _WRITERS[db_path] = conn
+            _WRITE_LOCKS.setdefault(db_path, threading.RLock())
+        return conn
+
+
+def get_reader(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """
+    A fresh read-only connection; the caller closes it. Nothing in this tree
+    reads yet: this is the entry point for future readers (analysis, pruning).
+    Readers only see committed data, so rows from a bulk load in progress
+    appear once its write_transaction commits.
+    """
+    conn = _connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA query_only=ON;")
     return conn
 
 
+def close_writers() -> None:
+    with _WRITERS_LOCK:
+        while _WRITERS:
+            _, conn = _WRITERS.popitem()
+            conn.close()
+
+
+@contextmanager
+def write_transaction(db_path: str = DEFAULT_DB_PATH) -> Iterator[sqlite3.Connection]:
+    """
+    BEGIN IMMEDIATE ... COMMIT on the writer connection, for a whole bulk load.
+    Rolls back on error. Not reentrant: nesting on the same thread raises
+    (pass the open `conn` along instead); other threads wait their turn.
+    """
+    conn = get_writer(db_path)
+    with _WRITE_LOCKS[db_path]:
+        if conn.in_transaction:
+            raise RuntimeError(
+                f"write_transaction already open for {db_path!r}; pass its conn instead of nesting"
+            )
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            # SQLite may already have rolled back (SQLITE_FULL, IOERR, interrupt);
+            # a failed COMMIT leaves the transaction open. Either way the
+            # long-lived writer must end up out of the transaction.
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+
 def init_db(db_path: str = DEFAULT_DB_PATH) -> None:
-    with _connect(db_path) as conn:
-        conn.executescript(_SCHEMA)
+    get_writer(db_path).executescript(_SCHEMA)
+    with write_transaction(db_path) as conn:
+        _ensure_event_key(conn)
 
 
-def upsert_events(chain: str, events: Iterable[Dict[str, Any]], db_path: str = DEFAULT_DB_PATH) -> int:
+def _build_row(chain: str, e: Dict[str, Any]) -> Tuple:
+    """
+    One Alchemy transfer -> one `transactions` row.
+    """
+    block_num_hex = e.get("blockNum")
+    block_number = int(block_num_hex, 16) if block_num_hex else None
+    raw_contract = e.get("rawContract") or _EMPTY
+    metadata = e.get("metadata") or _EMPTY
+    erc1155_metadata = e.get("erc1155Metadata")
+    tx_hash = e.get("hash")
+    unique_id = e.get("uniqueId") or ""  # ensure non-null for the key
+    return (
+        _event_key(chain, tx_hash, unique_id),
+        chain,
+        tx_hash,
+        unique_id,
+        block_number,
+        metadata.get("blockTimestamp") or e.get("blockTimestamp"),
+        e.get("from"),
+        e.get("to"),
+        e.get("asset"),
+        e.get("value"),
+        raw_contract.get("value"),
+        e.get("category"),
+        raw_contract.get("address"),
+        e.get("erc721TokenId"),
+        json_dumps(erc1155_metadata) if erc1155_metadata else None,
+        json_dumps(e),
+    )
+
+
+def _rows(chain: str, events: Iterable[Dict[str, Any]]) -> Iterator[Tuple]:
+    for e in events:
+        yield _build_row(chain, e)
+
+
+def _rows_per_statement(conn: sqlite3.Connection) -> int:
+    if hasattr(conn, "getlimit"):
+        max_vars = conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    else:
+        max_vars = 999  # SQLite's historical default
+    return max(1, min(BULK_INSERT_ROWS, max_vars // _N_COLUMNS))
+
+
+def upsert_events(
+    chain: str,
+    events: Iterable[Dict[str, Any]],
+    db_path: str = DEFAULT_DB_PATH,
+    conn: Optional[sqlite3.Connection] = None,
+) -> int:
     """
     Insert many events; returns count of attempted inserts.
     Uses INSERT OR IGNORE to be idempotent across re-runs.
+    Pass `conn` (see write_transaction) to share one transaction across calls;
+    otherwise a transaction is opened and committed just for this batch.
     """
-    events = list(events)
-    if not events:
-        return 0
+    if conn is None:
+        with write_transaction(db_path) as own_conn:
+            return upsert_events(chain, events, conn=own_conn)
 
-    rows = []
-    for e in events:
-        block_num_hex = e.get("blockNum")
-        block_number = int(block_num_hex, 16) if block_num_hex else None
-        raw_contract = e.get("rawContract") or {}
-        rows.append((
-            chain,
-            e.get("hash"),
-            e.get("uniqueId") or "",  # ensure non-null for UNIQUE
-            block_number,
-            e.get("metadata", {}).get("blockTimestamp") or e.get("blockTimestamp"),
-            e.get("from"),
-            e.get("to"),
-            e.get("asset"),
-            e.get("value"),
-            raw_contract.get("value"),
-            e.get("category"),
-            raw_contract.get("address"),
-            e.get("erc721TokenId"),
-            json.dumps(e.get("erc1155Metadata")) if e.get("erc1155Metadata") else None,
-            json.dumps(e, ensure_ascii=False),
-        ))
-
-    with _connect(db_path) as conn:
-        conn.executemany(_INSERT, rows)
-    return len(rows)
+    # Full chunks go in as one multi-row INSERT each; the short tail goes
+    # through the single-row statement.
+    rows = _rows(chain, events)
+    per_stmt = _rows_per_statement(conn)
+    bulk_sql = _INSERT_PREFIX + ", ".join([_ROW_PLACEHOLDERS] * per_stmt) + ";"
+    count = 0
+    while True:
+        chunk = list(itertools.islice(rows, per_stmt))
+        count += len(chunk)
+        if len(chunk) < per_stmt:
+            conn.executemany(_INSERT, chunk)
+            return count
+        conn.execute(bulk_sql, list(itertools.chain.from_iterable(chunk)))
@@ -4,47 +4,124 @@ CLI entrypoint:
 - queries Alchemy Transfers API for ETH/Base/Arbitrum
 - ONLY stores external/native + ERC20 transfers (filters out NFT & internal)
 - applies spam filtering before insert (URLs, weird symbols, zero value, optional dust)
-- paginates both inbound and outbound
+- paginates both inbound and outbound, all chains x directions concurrently
 - stores results in SQLite
 """
 
+import asyncio
+import itertools
 import re
 import sys
-import time
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlsplit
 
-import requests
-from requests.adapters import HTTPAdapter, Retry
+import httpx
 
 from config import (
     ALCHEMY_RPC_BY_CHAIN,
+    BACKOFF_FACTOR,
     FETCH_CATEGORIES,          # ['external', 'erc20']
     CHAINS,
     DEFAULT_ORDER,
+    FORCE_IPV4,
     FROM_BLOCK,
+    KEEPALIVE_TIMEOUT_SECONDS,
+    MAX_CONNECTIONS,
     MAX_COUNT_HEX,
+    MAX_IN_FLIGHT_PER_HOST,
+    MAX_RETRIES,
     REQUEST_TIMEOUT_SECONDS,
     RETRY_STATUS,
 )
-from db import init_db, upsert_events
+from db import close_writers, init_db, upsert_events, write_transaction
+from json_codec import dumpb as json_dumpb, loads as json_loads
 from spam_filters import is_spam_event
 
-ADDRESS_RE = re.compile(r"^0x[a-fA-F0-9]{40}$")
+ADDRESS_RE = re.compile(r"0x[a-fA-F0-9]{40}")  # used with fullmatch
 ALLOWED_CATEGORIES = {"external", "erc20"}  # safety net filter
+# Transfer fields that repeat across most events (the wallet itself, a handful of
+# tokens/categories); interned so a chain's buffered events share one copy each.
+_INTERNED_FIELDS = ("from", "to", "asset", "category")
 
 
-def _make_session() -> requests.Session:
-    s = requests.Session()
-    retries = Retry(
-        total=5,
-        backoff_factor=0.8,
-        status_forcelist=list(RETRY_STATUS),
-        allowed_methods=["POST"],
-        raise_on_status=False,
+def _is_evm_address(s: str) -> bool:
+    # fullmatch: unlike `$`, it does not accept a trailing newline
+    return ADDRESS_RE.fullmatch(s) is not None
+
+
+def _intern_repeated_fields(transfers: List[Dict]) -> None:
+    for t in transfers:
+        for field in _INTERNED_FIELDS:
+            v = t.get(field)
+            if type(v) is str:
+                t[field] = sys.intern(v)
+        raw_contract = t.get("rawContract")
+        if raw_contract and type(raw_contract.get("address")) is str:
+            raw_contract["address"] = sys.intern(raw_contract["address"])
+
+
+def _make_client() -> httpx.AsyncClient:
+    """
+    One HTTP/2 client for the whole run: every chain, direction and page of a
+    host is multiplexed over one kept-alive connection, so DNS and TLS happen
+    once per host rather than once per request.
+    """
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_TIMEOUT_SECONDS,
+        ),
+        local_address="0.0.0.0" if FORCE_IPV4 else None,
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        headers={"Content-Type": "application/json"},
+        timeout=httpx.Timeout(REQUEST_TIMEOUT_SECONDS),
     )
-    s.mount("https://", HTTPAdapter(max_retries=retries))
-    s.headers.update({"Content-Type": "application/json"})
-    return s
+
+
+def _retry_delay(resp: httpx.Response, attempt: int) -> float:
+    """
+    Seconds to wait before retrying: honor Retry-After, else exponential backoff.
+    """
+    retry_after = resp.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass  # HTTP-date form; fall back to our own backoff
+    return BACKOFF_FACTOR * (2 ** attempt)
+
+
+async def _post_rpc(
+    client: httpx.AsyncClient,
+    rpc_url: str,
+    body: bytes,
+    sem: asyncio.Semaphore,
+) -> Dict:
+    """
+    POST one pre-serialized JSON-RPC call; retry RETRY_STATUS responses and connection errors.
+    The semaphore is held only for the request itself, never while backing off.
+    """
+    attempt = 0
+    while True:
+        try:
+            async with sem:
+                resp = await client.post(rpc_url, content=body)
+        except httpx.TransportError:  # connect/read errors and timeouts
+            if attempt >= MAX_RETRIES:
+                raise
+            delay = BACKOFF_FACTOR * (2 ** attempt)
+        else:
+            if resp.status_code < 400:
+                return json_loads(resp.content)
+            if resp.status_code not in RETRY_STATUS or attempt >= MAX_RETRIES:
+                raise RuntimeError(f"Alchemy error {resp.status_code}: {resp.text[:300]}")
+            delay = _retry_delay(resp, attempt)
+        attempt += 1
+        await asyncio.sleep(delay)
 
 
 def _params_template(address: str, direction: str, categories: List[str]) -> Dict:
@@ -68,80 +145,102 @@ def _params_template(address: str, direction: str, categories: List[str]) -> Dic
     return p
 
 
-def _fetch_all_transfers_for_direction(
-    session: requests.Session,
+async def _fetch_all_transfers_for_direction(
+    client: httpx.AsyncClient,
     rpc_url: str,
     params_obj: Dict,
+    sem: asyncio.Semaphore,
 ) -> List[Dict]:
     """
     Loop `pageKey` to fetch all pages for one direction on one chain.
+    The request body is built once; only its pageKey changes between pages.
     """
     out: List[Dict] = []
-    page_key: Optional[str] = None
+    params = dict(params_obj)
+    body = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "alchemy_getAssetTransfers",
+        "params": [params],
+    }
 
     while True:
-        body = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "alchemy_getAssetTransfers",
-            "params": [params_obj | ({"pageKey": page_key} if page_key else {})],
-        }
-        resp = session.post(rpc_url, json=body, timeout=REQUEST_TIMEOUT_SECONDS)
-        if resp.status_code == 429:
-            time.sleep(1.5)
-            continue
-        if resp.status_code >= 400:
-            raise RuntimeError(f"Alchemy error {resp.status_code}: {resp.text[:300]}")
-
-        data = resp.json()
+        data = await _post_rpc(client, rpc_url, json_dumpb(body), sem)
         result = (data or {}).get("result") or {}
         transfers = result.get("transfers", [])
+        _intern_repeated_fields(transfers)
         out.extend(transfers)
-        page_key = result.get("pageKey")
+        page_key: Optional[str] = result.get("pageKey")
         if not page_key:
             break
+        params["pageKey"] = page_key
     return out
 
 
-def _unique_by_tx_and_unique_id(events: Iterable[Dict]) -> List[Dict]:
-    seen = set()
-    deduped = []
+def _unique_by_tx_and_unique_id(events: Iterable[Dict]) -> Iterable[Dict]:
+    # dicts keep insertion order; setdefault keeps the first event seen per key
+    seen: Dict[tuple, Dict] = {}
     for e in events:
-        key = (e.get("hash"), e.get("uniqueId") or "")
-        if key in seen:
-            continue
-        seen.add(key)
-        deduped.append(e)
-    return deduped
+        seen.setdefault((e.get("hash"), e.get("uniqueId") or ""), e)
+    return seen.values()
 
 
-def _filter_allowed_categories(events: Iterable[Dict]) -> List[Dict]:
-    out = []
+def _filter_allowed_categories(events: Iterable[Dict]) -> Iterator[Dict]:
     for e in events:
         cat = (e.get("category") or "").lower()
         if cat in ALLOWED_CATEGORIES:
-            out.append(e)
-    return out
+            yield e
 
 
-def _apply_spam_filters(events: Iterable[Dict], chain: str) -> List[Dict]:
-    return [e for e in events if not is_spam_event(e, chain)]
+def _apply_spam_filters(events: Iterable[Dict], chain: str) -> Iterator[Dict]:
+    return (e for e in events if not is_spam_event(e, chain))
 
 
-def fetch_all_for_chain(address: str, chain: str) -> List[Dict]:
+async def fetch_all_for_chain(
+    client: httpx.AsyncClient,
+    address: str,
+    chain: str,
+    sem: asyncio.Semaphore,
+) -> Iterator[Dict]:
     """
-    Fetch all transfers (in + out) for one chain; return normalized, de-spammed list.
+    Fetch all transfers (in + out, concurrently) for one chain.
+    Returns a lazy iterator of deduped, de-spammed events: filtering runs
+    as the consumer (upsert_events) pulls rows, in a single pass.
     """
     rpc_url = ALCHEMY_RPC_BY_CHAIN[chain]
-    session = _make_session()
 
-    incoming = _fetch_all_transfers_for_direction(session, rpc_url, _params_template(address, "to", FETCH_CATEGORIES))
-    outgoing = _fetch_all_transfers_for_direction(session, rpc_url, _params_template(address, "from", FETCH_CATEGORIES))
+    tasks = [
+        asyncio.create_task(
+            _fetch_all_transfers_for_direction(client, rpc_url, _params_template(address, direction, FETCH_CATEGORIES), sem)
+        )
+        for direction in ("to", "from")
+    ]
+    try:
+        incoming, outgoing = await asyncio.gather(*tasks)
+    except BaseException:
+        # gather() doesn't cancel the sibling; stop it paging on a chain we're abandoning
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
 
-    merged = _unique_by_tx_and_unique_id([*incoming, *outgoing])
-    merged = _filter_allowed_categories(merged)
-    merged = _apply_spam_filters(merged, chain)
-    return merged
+    unique = _unique_by_tx_and_unique_id(itertools.chain(incoming, outgoing))
+    return _apply_spam_filters(_filter_allowed_categories(unique), chain)
+
+
+async def _fetch_all_chains(address: str) -> List:
+    """
+    Run every chain concurrently; one semaphore per RPC host caps in-flight calls.
+    Returns one entry per CHAINS item: the event iterator, or the exception it raised.
+    """
+    sems: Dict[str, asyncio.Semaphore] = {}
+    async with _make_client() as client:
+        tasks = []
+        for chain in CHAINS:
+            host = urlsplit(ALCHEMY_RPC_BY_CHAIN[chain]).netloc
+            sem = sems.setdefault(host, asyncio.Semaphore(MAX_IN_FLIGHT_PER_HOST))
+            tasks.append(fetch_all_for_chain(client, address, chain, sem))
+        return await asyncio.gather(*tasks, return_exceptions=True)
 
 
 def main() -> int:
@@ -150,22 +249,39 @@ def main() -> int:
         return 2
 
     address = sys.argv[1].strip()
-    if not ADDRESS_RE.match(address):
+    if not _is_evm_address(address):
         print("Error: please provide a valid 0x-prefixed 40-hex EVM address.")
         return 2
 
     init_db()
 
+    print(f"Fetching transfers on {', '.join(CHAINS)} (external + erc20 only, spam filtered)...")
+    results = asyncio.run(_fetch_all_chains(address))
+
     total = 0
-    for chain in CHAINS:
-        try:
-            print(f"[{chain}] fetching transfers (external + erc20 only, spam filtered)...")
-            events = fetch_all_for_chain(address, chain)
-            n = upsert_events(chain, events)
-            total += n
-            print(f"[{chain}] fetched {len(events)} events, inserted {n}.")
-        except Exception as e:
-            print(f"[{chain}] ERROR: {e}")
+    try:
+        with write_transaction() as conn:
+            for chain, events in zip(CHAINS, results):
+                if isinstance(events, BaseException):
+                    print(f"[{chain}] ERROR: {events}")
+                    continue
+                # Rows stream into the INSERTs, so a chain that fails partway
+                # is rolled back to its savepoint: all-or-nothing per chain.
+                conn.execute("SAVEPOINT chain_load")
+                try:
+                    n = upsert_events(chain, events, conn=conn)
+                except Exception as e:
+                    if not conn.in_transaction:
+                        raise  # SQLite rolled back the whole transaction; nothing left to save
+                    conn.execute("ROLLBACK TO chain_load")
+                    conn.execute("RELEASE chain_load")
+                    print(f"[{chain}] ERROR: {e}")
+                    continue
+                conn.execute("RELEASE chain_load")
+                total += n
+                print(f"[{chain}] fetched and inserted {n} events.")
+    finally:
+        close_writers()
 
     print(f"Done. Attempted to insert {total} rows. See transactions.sqlite3")
     return 0
@@ -0,0 +1,44 @@
+"""
+JSON helpers: use orjson when it is installed, fall back to stdlib json.
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def dumps(obj: Any) -> str:
+    """
+    Compact JSON text; non-ASCII is kept as-is (like ensure_ascii=False).
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            pass  # e.g. ints wider than 64 bits; stdlib json handles those
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumpb(obj: Any) -> bytes:
+    """
+    Like dumps, but UTF-8 bytes ready to send as a request body.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Parse JSON from raw response bytes (or text).
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
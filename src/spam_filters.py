@@ -2,6 +2,7 @@
 Shared spam filtering logic (used by fetch and the pruning utility).
 """
 import re
+from functools import lru_cache
 from typing import Dict, Any
 
 from config import (
@@ -12,23 +13,29 @@ from config import (
     DUST_WEI_THRESHOLDS,
 )
 
+_EMPTY: Dict[str, Any] = {}  # shared stand-in for a missing rawContract; never mutated
+
 _ASSET_ALLOWED_RE = re.compile(ASSET_ALLOWED_PATTERN)
-# Build a permissive "looks like a URL/domain" regex with our TLDs
+# One alternation for spam keywords plus a permissive "looks like a URL/domain"
+# match with our TLDs, so each asset string is scanned once.
 _TLD_ALT = "|".join([re.escape(t) for t in SPAM_TLDS])
-_URL_LIKE_RE = re.compile(
-    rf"(https?://|www\.)|([a-z0-9-]{{1,63}}\.(?:{_TLD_ALT})(?:[/?#].*)?)",
+_KEYWORD_ALT = "|".join([re.escape(k) for k in SPAM_KEYWORDS])
+_SPAM_RE = re.compile(
+    rf"{_KEYWORD_ALT}|https?://|www\.|[a-z0-9-]{{1,63}}\.(?:{_TLD_ALT})",
     flags=re.IGNORECASE,
 )
 
-def _safe_lower(s):
-    return (s or "").lower()
-
 def _value_is_zero(e: Dict[str, Any]) -> bool:
     v = e.get("value")
+    # Alchemy 'value' is typically a float (or None); keep that path free of try/except
+    t = type(v)
+    if t is float or t is int:
+        return v == 0
+    if v is None:
+        return False
     try:
-        # Alchemy 'value' is typically a float or str convertible to float
-        return float(v) == 0.0
-    except Exception:
+        return float(v) == 0.0  # e.g. numeric strings
+    except (TypeError, ValueError, OverflowError):
         return False
 
 def _under_dust(e: Dict[str, Any], chain: str) -> bool:
@@ -37,22 +44,18 @@ def _under_dust(e: Dict[str, Any], chain: str) -> bool:
         return False
     if (e.get("category") or "").lower() != "external":
         return False
-    raw = ((e.get("rawContract") or {}).get("value"))  # hex string like "0x..."
-    if not raw:
+    raw = (e.get("rawContract") or _EMPTY).get("value")  # hex string like "0x..."
+    if not raw or type(raw) is not str:
         return False
     try:
-        wei = int(raw, 16)
-        return wei < threshold
-    except Exception:
+        return int(raw, 16) < threshold
+    except ValueError:
         return False
 
 def _asset_has_url_or_keywords(asset: str) -> bool:
-    a = _safe_lower(asset)
-    if not a:
+    if not asset:
         return False
-    if any(k in a for k in (kw.lower() for kw in SPAM_KEYWORDS)):
-        return True
-    return bool(_URL_LIKE_RE.search(a))
+    return bool(_SPAM_RE.search(asset))
 
 def _asset_is_weird(asset: str) -> bool:
     # Reject assets that don't pass the conservative allowlist
@@ -60,6 +63,13 @@ def _asset_is_weird(asset: str) -> bool:
         return False  # allow blank; most chains label native as "ETH" anyway
     return not bool(_ASSET_ALLOWED_RE.match(asset))
 
+@lru_cache(maxsize=4096)
+def _asset_is_spam(asset: str) -> bool:
+    # The asset checks depend only on the symbol string, and a wallet's events
+    # reuse a handful of symbols (spam airdrops included), so memoize per asset.
+    # Cheap anchored allowlist match first; only symbols that pass it need the scan.
+    return _asset_is_weird(asset) or _asset_has_url_or_keywords(asset)
+
 def is_spam_event(e: Dict[str, Any], chain: str) -> bool:
     """
     Returns True if the event looks like spam according to configured rules.
@@ -67,9 +77,7 @@ def is_spam_event(e: Dict[str, Any], chain: str) -> bool:
     asset = e.get("asset") or ""
     if EXCLUDE_ZERO_VALUE and _value_is_zero(e):
         return True
-    if _asset_has_url_or_keywords(asset):
-        return True
-    if _asset_is_weird(asset):
+    if _asset_is_spam(asset):
         return True
     if _under_dust(e, chain):
         return True